@@ -8,6 +8,9 @@ Available presets:
 - 'debug': Minimal trials for debugging
 """
 
+from collections import ChainMap
+from types import MappingProxyType
+
 # =============================================================================
 # PRESET CONFIGURATIONS
 # =============================================================================
@@ -141,23 +144,54 @@ def get_config(preset='quick'):
     """
     Get complete configuration by merging preset with fixed parameters.
     
+    Configurations are merged once at import (see _CONFIGS below); the
+    returned mapping is read-only so the shared values cannot be modified.
+    
     Args:
         preset: Name of preset configuration ('paper', 'quick', 'full', 'debug')
     
     Returns:
-        dict: Complete configuration dictionary
+        MappingProxyType: Complete (read-only) configuration mapping
     """
-    if preset not in PRESETS:
+    if preset not in _CONFIGS:
         raise ValueError(f"Unknown preset: {preset}. Available: {list(PRESETS.keys())}")
     
-    config = FIXED_PARAMS.copy()
-    config.update(PRESETS[preset])
+    return _CONFIGS[preset]
+
+
+def get_config_mutable(preset='quick'):
+    """
+    Get a modifiable copy of a preset configuration.
+    
+    Args:
+        preset: Name of preset configuration
+    
+    Returns:
+        dict: Complete configuration dictionary (safe to modify)
+    """
+    return dict(get_config(preset))
+
+
+def _build_config(preset):
+    """
+    Layer a preset over the fixed parameters and add derived values.
+    
+    The preset and FIXED_PARAMS are not copied: a ChainMap looks keys up in
+    the derived values, then the preset, then the shared fixed parameters.
+    
+    Args:
+        preset: Name of preset configuration
+    
+    Returns:
+        MappingProxyType: Complete (read-only) configuration mapping
+    """
+    config = ChainMap({}, PRESETS[preset], FIXED_PARAMS)
     
-    # Calculate derived values
+    # Calculate derived values (stored in the first, preset-private layer)
     config['total_trials'] = config['n_blocks'] * config['n_trials_per_block']
     config['estimated_duration_minutes'] = estimate_duration(config)
     
-    return config
+    return MappingProxyType(config)
 
 
 def estimate_duration(config):
@@ -247,6 +281,15 @@ def list_presets():
     print()
 
 
+# =============================================================================
+# PRECOMPUTED CONFIGURATIONS
+# =============================================================================
+
+# Presets never change at runtime, so merge them (and compute the derived
+# values) once at import instead of on every get_config call.
+_CONFIGS = {preset_name: _build_config(preset_name) for preset_name in PRESETS}
+
+
 if __name__ == '__main__':
     # Demo: show all presets
     list_presets()
@@ -1,6 +1,14 @@
 
 from psychopy import visual, core, event
-import os, csv, random
+from psychopy.hardware import keyboard
+import os, csv
+from types import SimpleNamespace
+import numpy as np
+
+try:
+    from pylsl import StreamInfo, StreamOutlet
+except ImportError:  # LSL markers are optional
+    StreamOutlet = None
 
 # --------------------------
 # Experiment parameters
@@ -12,6 +20,8 @@ MOVEMENT_DURATION = 0.8
 ITI_DURATION = 0.5
 SUCCESS_DURATION = 1.0
 ERROR_PROB = 0.2
+MAX_MOVEMENTS = 4 * N_POSITIONS  # error draws made up front per trial
+RANDOM_SEED = None  # set to an int to replay the same targets and errors
 
 # --------------------------
 # color
@@ -26,146 +36,7 @@ FIXATION_COLOR = [0.9, 0.9, 0.9]     # white
 SUCCESS_COLOR = [1, 0.9, 0.1]        # yellow
 
 # --------------------------
-# Window setup
-# --------------------------
-win = visual.Window(
-    size=[1280, 720],
-    units="norm",
-    color=BG_COLOR,
-    fullscr=False,
-    allowGUI=True
-)
-win.mouseVisible = True
-
-fixation = visual.TextStim(
-    win, 
-    text="+", 
-    height=0.1, 
-    color=FIXATION_COLOR,
-    pos=(0, 0)
-)
-
-# --------------------------
-# Instruction screens (更新颜色描述)
-# --------------------------
-instruction_1 = visual.TextStim(
-    win,
-    text=(
-        "Welcome to the Error-Related Potential (ErrP) Task\n\n"
-        "In this experiment, you will observe a cursor (blue square)\n"
-        "automatically moving toward a target (orange square).\n\n"
-        "CLICK THIS WINDOW, then press SPACE to continue"
-    ),
-    height=0.06,
-    color=FIXATION_COLOR,
-    wrapWidth=1.6
-)
-
-instruction_2 = visual.TextStim(
-    win,
-    text=(
-        "How it works:\n\n"
-        "• Each trial starts with a GRAY square at the center\n"
-        "• An ORANGE target will appear somewhere on the line\n"
-        "• The square will turn BLUE and move toward the target\n"
-        "• An arrow will show the movement direction\n\n"
-        "Press SPACE to continue"
-    ),
-    height=0.06,
-    color=FIXATION_COLOR,
-    wrapWidth=1.6
-)
-
-instruction_3 = visual.TextStim(
-    win,
-    text=(
-        "IMPORTANT:\n\n"
-        "Sometimes the cursor will move in the WRONG direction!\n"
-        "This is intentional - it happens automatically.\n\n"
-        "Your task is to simply OBSERVE and pay attention\n"
-        "to when the cursor makes these errors.\n\n"
-        "Press SPACE to continue"
-    ),
-    height=0.06,
-    color=FIXATION_COLOR,
-    wrapWidth=1.6
-)
-
-instruction_4_text = visual.TextStim(
-    win,
-    text="Visual Guide:",
-    height=0.07,
-    color=FIXATION_COLOR,
-    pos=(0, 0.35)
-)
-
-# Example visuals with new colors
-example_gray = visual.Rect(win, width=0.06, height=0.06, fillColor=CURSOR_PREP_COLOR, pos=(-0.5, 0.15))
-example_gray_label = visual.TextStim(win, text="Starting position\n(waiting)", height=0.05, color=FIXATION_COLOR, pos=(-0.5, -0.05))
-
-example_blue = visual.Rect(win, width=0.06, height=0.06, fillColor=CURSOR_COLOR, pos=(0, 0.15))
-example_blue_label = visual.TextStim(win, text="Active cursor\n(moving)", height=0.05, color=FIXATION_COLOR, pos=(0, -0.05))
-
-example_orange = visual.Rect(win, width=0.06, height=0.06, fillColor=TARGET_COLOR, pos=(0.5, 0.15))
-example_orange_label = visual.TextStim(win, text="Target\n(destination)", height=0.05, color=FIXATION_COLOR, pos=(0.5, -0.05))
-
-instruction_4_bottom = visual.TextStim(
-    win,
-    text="Press SPACE to start the experiment",
-    height=0.06,
-    color=SUCCESS_COLOR,
-    pos=(0, -0.35)
-)
-
-trial_counter = visual.TextStim(
-    win,
-    text="",
-    height=0.06,
-    color=FIXATION_COLOR,
-    pos=(0, -0.4)
-)
-
-success_text = visual.TextStim(
-    win,
-    text="TARGET REACHED!",  
-    height=0.1,
-    color=SUCCESS_COLOR,
-    pos=(0, 0.3),
-    bold=True
-)
-
-# --------------------------
-# Cursor & Target
-# --------------------------
-cursor = visual.Rect(
-    win,
-    width=0.08,
-    height=0.08,
-    fillColor=CURSOR_COLOR,
-    lineColor=None
-)
-
-target = visual.Rect(
-    win,
-    width=0.08,
-    height=0.08,
-    fillColor=TARGET_COLOR,
-    lineColor=None
-)
-
-# success highlight
-success_highlight = visual.Rect(
-    win,
-    width=0.14,  
-    height=0.14,
-    fillColor=None,
-    lineColor=SUCCESS_COLOR,
-    lineWidth=6,  
-    opacity=1.0  
-)
-
-# --------------------------
-# Arrow
+# Arrow shape
 # --------------------------
 def create_arrow_vertices(length=0.10, head_width=0.04):
     vertices = [
@@ -179,203 +50,488 @@ def create_arrow_vertices(length=0.10, head_width=0.04):
     ]
     return vertices
 
-arrow = visual.ShapeStim(
-    win,
-    vertices=create_arrow_vertices(),
-    fillColor=ARROW_COLOR,
-    lineColor=None,
-    opacity=0.5
-)
-
-# --------------------------
-# Reference line
-# --------------------------
-reference_line = visual.Line(
-    win,
-    start=(-0.85, 0),
-    end=(0.85, 0),
-    lineColor=[0.4, 0.4, 0.4],
-    lineWidth=1,
-    opacity=0.3
-)
-
 # --------------------------
 # Positions array
 # --------------------------
-positions = [-0.8 + i * (1.6/(N_POSITIONS-1)) for i in range(N_POSITIONS)]
-START_POSITION = min(range(len(positions)), key=lambda i: abs(positions[i]))
+positions = np.linspace(-0.8, 0.8, N_POSITIONS)
+START_POSITION = int(np.argmin(np.abs(positions)))
+LAST_POSITION = N_POSITIONS - 1
+
+# Arrow anchor (just below the line) for every cursor index
+ARROW_POSITIONS = np.column_stack((positions, np.full(N_POSITIONS, -0.15)))
+
+# Single generator for targets and movement errors
+rng = np.random.default_rng(RANDOM_SEED)
+
+# Valid targets (at least 3 steps away) for every cursor index
+FAR_TARGETS = tuple(
+    np.flatnonzero(np.abs(np.arange(N_POSITIONS) - i) >= 3)
+    for i in range(N_POSITIONS)
+)
 
 def new_target(cursor_pos):
-    possible_positions = [i for i in range(N_POSITIONS) 
-                         if abs(i - cursor_pos) >= 3]
-    if possible_positions:
-        return random.choice(possible_positions)
+    possible_positions = FAR_TARGETS[cursor_pos]
+    if possible_positions.size:
+        return int(rng.choice(possible_positions))
     else:
         return (cursor_pos + 5) % N_POSITIONS
 
-def direction(a, b):
-    return (b > a) - (b < a)
+# Error bitmask for n movements (True = move away from the target),
+# drawn in one call instead of one random draw per movement
+def draw_errors(n):
+    return rng.random(n) < ERROR_PROB
+
+# Whole movement sequence of a trial as (prev_idx, cursor_idx, is_error)
+# steps, computed before any drawing so the render loop only replays it.
+# The cursor never passes the target, so the correct direction is fixed.
+def plan_trial(cursor_idx, target_idx):
+    d = (target_idx > cursor_idx) - (target_idx < cursor_idx)
+    error_draws = draw_errors(MAX_MOVEMENTS)
+    steps = []
+    while cursor_idx != target_idx:
+        if len(steps) == len(error_draws):
+            error_draws = np.concatenate((error_draws, draw_errors(MAX_MOVEMENTS)))
+        is_error = bool(error_draws[len(steps)])
+        prev_idx = cursor_idx
+        # Clamp to the line (comparison chain, no min/max calls)
+        cursor_idx += -d if is_error else d
+        cursor_idx = 0 if cursor_idx < 0 else LAST_POSITION if cursor_idx > LAST_POSITION else cursor_idx
+        steps.append((prev_idx, cursor_idx, is_error))
+    return steps
 
 # --------------------------
 # Logging
 # --------------------------
-os.makedirs("data/logs", exist_ok=True)
 log_file = "data/logs/errp_log.csv"
-results = []
-global_clock = core.Clock()
+frame_log_file = "data/logs/errp_frame_intervals.csv"
+LOG_FIELDS = (
+    "time", "trial", "movement", "cursor_idx", "target_idx",
+    "prev_cursor_idx", "is_error", "movement_direction"
+)
+
+# LSL marker for a movement onset (only sent if pylsl is installed):
+# trial * 10000 + movement * 10 + 2 for an error / 1 for a correct move
+def movement_marker(trial, movement, is_error):
+    return trial * 10000 + movement * 10 + (2 if is_error else 1)
 
 # --------------------------
-# Show instruction screens
+# Stimuli
 # --------------------------
-instruction_1.draw()
-win.flip()
-event.waitKeys(keyList=["space"])
-
-instruction_2.draw()
-win.flip()
-event.waitKeys(keyList=["space"])
-
-instruction_3.draw()
-win.flip()
-event.waitKeys(keyList=["space"])
-
-instruction_4_text.draw()
-example_gray.draw()
-example_gray_label.draw()
-example_blue.draw()
-example_blue_label.draw()
-example_orange.draw()
-example_orange_label.draw()
-instruction_4_bottom.draw()
-win.flip()
-event.waitKeys(keyList=["space"])
+def build_stimuli(win):
+    """Create every stimulus used by the experiment on ``win``."""
+    stims = SimpleNamespace()
+    
+    stims.fixation = visual.TextStim(
+        win, 
+        text="+", 
+        height=0.1, 
+        color=FIXATION_COLOR,
+        pos=(0, 0)
+    )
+
+    # --------------------------
+    # Instruction screens (更新颜色描述)
+    # --------------------------
+    stims.instruction_1 = visual.TextStim(
+        win,
+        text=(
+            "Welcome to the Error-Related Potential (ErrP) Task\n\n"
+            "In this experiment, you will observe a cursor (blue square)\n"
+            "automatically moving toward a target (orange square).\n\n"
+            "CLICK THIS WINDOW, then press SPACE to continue"
+        ),
+        height=0.06,
+        color=FIXATION_COLOR,
+        wrapWidth=1.6
+    )
+
+    stims.instruction_2 = visual.TextStim(
+        win,
+        text=(
+            "How it works:\n\n"
+            "• Each trial starts with a GRAY square at the center\n"
+            "• An ORANGE target will appear somewhere on the line\n"
+            "• The square will turn BLUE and move toward the target\n"
+            "• An arrow will show the movement direction\n\n"
+            "Press SPACE to continue"
+        ),
+        height=0.06,
+        color=FIXATION_COLOR,
+        wrapWidth=1.6
+    )
+
+    stims.instruction_3 = visual.TextStim(
+        win,
+        text=(
+            "IMPORTANT:\n\n"
+            "Sometimes the cursor will move in the WRONG direction!\n"
+            "This is intentional - it happens automatically.\n\n"
+            "Your task is to simply OBSERVE and pay attention\n"
+            "to when the cursor makes these errors.\n\n"
+            "Press SPACE to continue"
+        ),
+        height=0.06,
+        color=FIXATION_COLOR,
+        wrapWidth=1.6
+    )
+
+    instruction_4_text = visual.TextStim(
+        win,
+        text="Visual Guide:",
+        height=0.07,
+        color=FIXATION_COLOR,
+        pos=(0, 0.35)
+    )
+
+    # Example visuals with new colors
+    example_gray = visual.Rect(win, width=0.06, height=0.06, fillColor=CURSOR_PREP_COLOR, pos=(-0.5, 0.15))
+    example_gray_label = visual.TextStim(win, text="Starting position\n(waiting)", height=0.05, color=FIXATION_COLOR, pos=(-0.5, -0.05))
+
+    example_blue = visual.Rect(win, width=0.06, height=0.06, fillColor=CURSOR_COLOR, pos=(0, 0.15))
+    example_blue_label = visual.TextStim(win, text="Active cursor\n(moving)", height=0.05, color=FIXATION_COLOR, pos=(0, -0.05))
+
+    example_orange = visual.Rect(win, width=0.06, height=0.06, fillColor=TARGET_COLOR, pos=(0.5, 0.15))
+    example_orange_label = visual.TextStim(win, text="Target\n(destination)", height=0.05, color=FIXATION_COLOR, pos=(0.5, -0.05))
+
+    instruction_4_bottom = visual.TextStim(
+        win,
+        text="Press SPACE to start the experiment",
+        height=0.06,
+        color=SUCCESS_COLOR,
+        pos=(0, -0.35)
+    )
+
+    # The visual guide is a single static screen: flatten it into one
+    # texture and let the individual stims go
+    stims.visual_guide = visual.BufferImageStim(
+        win,
+        stim=[
+            instruction_4_text,
+            example_gray, example_gray_label,
+            example_blue, example_blue_label,
+            example_orange, example_orange_label,
+            instruction_4_bottom,
+        ]
+    )
+
+    # One pre-rendered counter per trial, so the text is laid out once up
+    # front instead of being re-rasterised when it changes mid-session
+    stims.trial_counters = [
+        visual.TextStim(
+            win,
+            text=f"Trial {i + 1} / {N_TRIALS}",
+            height=0.06,
+            color=FIXATION_COLOR,
+            pos=(0, -0.4)
+        )
+        for i in range(N_TRIALS)
+    ]
+
+    stims.success_text = visual.TextStim(
+        win,
+        text="TARGET REACHED!",  
+        height=0.1,
+        color=SUCCESS_COLOR,
+        pos=(0, 0.3),
+        bold=True
+    )
+
+    stims.end_text = visual.TextStim(
+        win,
+        text="Experiment Complete!\n\nThank you for participating.",
+        height=0.08,
+        color=FIXATION_COLOR
+    )
+
+    # --------------------------
+    # Cursor & Target
+    # --------------------------
+    # One pre-positioned square per position and colour, so a move or a
+    # colour change only selects which stim to draw instead of going
+    # through the .pos/.fillColor setters
+    def square(color, x):
+        return visual.Rect(
+            win,
+            width=0.08,
+            height=0.08,
+            fillColor=color,
+            lineColor=None,
+            pos=(x, 0)
+        )
+
+    stims.prep_cursor = square(CURSOR_PREP_COLOR, positions[START_POSITION])
+    stims.cursors = [square(CURSOR_COLOR, x) for x in positions]
+    stims.targets = [square(TARGET_COLOR, x) for x in positions]
+    stims.reached_targets = [square(TARGET_REACHED, x) for x in positions]
+
+    # success highlight
+    stims.success_highlight = visual.Rect(
+        win,
+        width=0.14,  
+        height=0.14,
+        fillColor=None,
+        lineColor=SUCCESS_COLOR,
+        lineWidth=6,  
+        opacity=1.0  
+    )
+
+    # --------------------------
+    # Arrows (one per direction, so no rotation is needed at run time)
+    # --------------------------
+    arrow_vertices = create_arrow_vertices()
+    stims.arrow_right = visual.ShapeStim(
+        win,
+        vertices=arrow_vertices,
+        fillColor=ARROW_COLOR,
+        lineColor=None,
+        opacity=0.5
+    )
+    stims.arrow_left = visual.ShapeStim(
+        win,
+        vertices=[(-x, y) for (x, y) in arrow_vertices],
+        fillColor=ARROW_COLOR,
+        lineColor=None,
+        opacity=0.5
+    )
+
+    # --------------------------
+    # Reference line
+    # --------------------------
+    stims.reference_line = visual.Line(
+        win,
+        start=(-0.85, 0),
+        end=(0.85, 0),
+        lineColor=[0.4, 0.4, 0.4],
+        lineWidth=1,
+        opacity=0.3
+    )
+    
+    return stims
 
 # --------------------------
-# Main experiment loop
+# Experiment
 # --------------------------
-for trial_num in range(N_TRIALS):
-    
-    keys = event.getKeys(['escape'])
-    if 'escape' in keys:
+def main():
+    # --------------------------
+    # Window setup
+    # --------------------------
+    win = visual.Window(
+        size=[1280, 720],
+        units="norm",
+        color=BG_COLOR,
+        fullscr=False,
+        allowGUI=True
+    )
+    win.mouseVisible = True
+
+    # Every screen is static until the next change, so each is flipped once
+    # and held with core.wait, less one frame so the next flip lands on time
+    refresh_rate = win.getActualFrameRate() or 60.0
+    frame_interval = 1.0 / refresh_rate
+
+    stims = build_stimuli(win)
+
+    # ESC quits from anywhere. Global keys are handled by PsychoPy whenever
+    # window events are dispatched, so the loops don't need to poll for it.
+    def quit_experiment():
         win.close()
         core.quit()
-    
-    # ------------------------
-    # PHASE 1: PREPARATION
-    # ------------------------
-    cursor_idx = START_POSITION
-    target_idx = new_target(cursor_idx)
-    
-    cursor.fillColor = CURSOR_PREP_COLOR
-    cursor.pos = (positions[cursor_idx], 0)
-    target.pos = (positions[target_idx], 0)
-    target.fillColor = TARGET_COLOR
-    
-    trial_counter.text = f"Trial {trial_num + 1} / {N_TRIALS}"
-    
-    clock = core.Clock()
-    while clock.getTime() < PREP_DURATION:
-        reference_line.draw()
-        cursor.draw()
-        target.draw()
-        trial_counter.draw()
-        win.flip()
-    
-    # ------------------------
-    # PHASE 2: MOVEMENT
-    # ------------------------
-    cursor.fillColor = CURSOR_COLOR
-    movements = 0
-    
-    while cursor_idx != target_idx:
-        movements += 1
-        
-        keys = event.getKeys(['escape'])
+
+    event.globalKeys.add(key='escape', func=quit_experiment)
+
+    # Instruction screens block on the hardware Keyboard (psychtoolbox
+    # backend when available). It doesn't go through the event module, so
+    # ESC is checked here as well.
+    kb = keyboard.Keyboard()
+
+    def wait_for_space():
+        keys = kb.waitKeys(keyList=['space', 'escape'], waitRelease=False, clear=True)
         if 'escape' in keys:
-            win.close()
-            core.quit()
-        
-        prev_cursor_idx = cursor_idx
-        
-        d = direction(cursor_idx, target_idx)
-        is_error = random.random() < ERROR_PROB
-        move = -d if is_error else d
-        cursor_idx = max(0, min(N_POSITIONS - 1, cursor_idx + move))
-        
-        cursor.pos = (positions[cursor_idx], 0)
-        target.pos = (positions[target_idx], 0)
-        
-        arrow_x = positions[cursor_idx]
-        arrow.pos = (arrow_x, -0.15)
-        if cursor_idx > prev_cursor_idx:
-            arrow.ori = 0
-        elif cursor_idx < prev_cursor_idx:
-            arrow.ori = 180
-        
-        clock = core.Clock()
-        while clock.getTime() < MOVEMENT_DURATION:
-            if cursor_idx != START_POSITION:
-                fixation.draw()
-            reference_line.draw()
-            arrow.draw()
-            target.draw()
+            quit_experiment()
+
+    global_clock = core.Clock()
+
+    # --------------------------
+    # Show instruction screens
+    # --------------------------
+    stims.instruction_1.draw()
+    win.flip()
+    wait_for_space()
+
+    stims.instruction_2.draw()
+    win.flip()
+    wait_for_space()
+
+    stims.instruction_3.draw()
+    win.flip()
+    wait_for_space()
+
+    stims.visual_guide.draw()
+    win.flip()
+    wait_for_space()
+
+    # --------------------------
+    # Main experiment loop
+    # --------------------------
+    # Rows are streamed to disk as they are produced, so nothing is held in
+    # memory and a session aborted with ESC still leaves a valid log.
+    os.makedirs(os.path.dirname(log_file), exist_ok=True)
+    log_fp = open(log_file, "w", newline="")
+    log_writer = csv.writer(log_fp)
+    log_writer.writerow(LOG_FIELDS)
+    write_row = log_writer.writerow
+    get_time = global_clock.getTime
+    
+    # Movement onsets are also pushed as LSL markers when pylsl is
+    # available, so they can be aligned with the EEG recording clock
+    marker_outlet = None
+    if StreamOutlet is not None:
+        marker_outlet = StreamOutlet(
+            StreamInfo('ErrP', 'Markers', 1, 0, 'int32', 'errp1')
+        )
+
+    arrow = stims.arrow_right
+
+    # The line, target and counter stay put for the whole trial, so they are
+    # rendered into one texture per trial (plus a variant with the fixation
+    # cross, shown once the cursor has left the start). The captures are
+    # made before the previous trial's ITI flip so they don't lengthen it.
+    def prepare_trial(trial_num):
+        target_idx = new_target(START_POSITION)
+        target = stims.targets[target_idx]
+        trial_counter = stims.trial_counters[trial_num]
+        background = visual.BufferImageStim(
+            win, stim=[stims.reference_line, target, trial_counter]
+        )
+        background_fix = visual.BufferImageStim(
+            win, stim=[stims.fixation, stims.reference_line, target, trial_counter]
+        )
+        return target_idx, trial_counter, background, background_fix
+
+    next_trial = prepare_trial(0)
+
+    # Every screen is flipped once, so each recorded frame interval is how
+    # long that screen actually stayed up. Its intended duration is kept
+    # alongside, one entry per flip (PsychoPy doesn't record the first flip
+    # after recording is switched on, so the two lists line up).
+    win.recordFrameIntervals = True
+    intended = []
+    add_intended = intended.append
+
+    try:
+        for trial_num in range(N_TRIALS):
+            
+            # ------------------------
+            # PHASE 1: PREPARATION
+            # ------------------------
+            cursor_idx = START_POSITION
+            target_idx, trial_counter, background, background_fix = next_trial
+            
+            cursor = stims.prep_cursor
+            
+            background.draw()
             cursor.draw()
+            win.flip()
+            add_intended(PREP_DURATION)
+            core.wait(PREP_DURATION - frame_interval)
+            
+            # ------------------------
+            # PHASE 2: MOVEMENT
+            # ------------------------
+            steps = plan_trial(cursor_idx, target_idx)
+            
+            for movements, (prev_cursor_idx, cursor_idx, is_error) in enumerate(steps, 1):
+                cursor = stims.cursors[cursor_idx]
+                
+                # A clamped move keeps the previous direction
+                if cursor_idx > prev_cursor_idx:
+                    arrow = stims.arrow_right
+                elif cursor_idx < prev_cursor_idx:
+                    arrow = stims.arrow_left
+                arrow.pos = ARROW_POSITIONS[cursor_idx]
+                
+                backdrop = background_fix if cursor_idx != START_POSITION else background
+                
+                backdrop.draw()
+                arrow.draw()
+                cursor.draw()
+                if marker_outlet is not None:
+                    win.callOnFlip(
+                        marker_outlet.push_sample,
+                        [movement_marker(trial_num, movements, is_error)]
+                    )
+                win.flip()
+                add_intended(MOVEMENT_DURATION)
+                core.wait(MOVEMENT_DURATION - frame_interval)
+                
+                write_row((
+                    get_time(),
+                    trial_num,
+                    movements,
+                    cursor_idx,
+                    target_idx,
+                    prev_cursor_idx,
+                    int(is_error),
+                    "right" if cursor_idx > prev_cursor_idx else "left"
+                ))
+            
+            # ------------------------
+            # PHASE 3: SUCCESS 
+            # ------------------------
+            target = stims.reached_targets[target_idx]
+            stims.success_highlight.pos = target.pos
+            
+            stims.reference_line.draw()
+            stims.success_highlight.draw()  
+            target.draw()  
+            cursor.draw()  
+            stims.success_text.draw()  
             trial_counter.draw()
             win.flip()
-        
-        results.append({
-            "time": global_clock.getTime(),
-            "trial": trial_num,
-            "movement": movements,
-            "cursor_idx": cursor_idx,
-            "target_idx": target_idx,
-            "prev_cursor_idx": prev_cursor_idx,
-            "is_error": int(is_error),
-            "movement_direction": "right" if cursor_idx > prev_cursor_idx else "left"
-        })
-    
-    # ------------------------
-    # PHASE 3: SUCCESS 
-    # ------------------------
-    target.fillColor = TARGET_REACHED  
-    success_highlight.pos = target.pos
-    
-    clock = core.Clock()
-    while clock.getTime() < SUCCESS_DURATION:
-        reference_line.draw()
-        success_highlight.draw()  
-        target.draw()  
-        cursor.draw()  
-        success_text.draw()  
-        trial_counter.draw()
-        win.flip()
-    
-    # ------------------------
-    # PHASE 4: ITI
-    # ------------------------
-    clock = core.Clock()
-    while clock.getTime() < ITI_DURATION:
-        fixation.draw()
-        win.flip()
+            add_intended(SUCCESS_DURATION)
+            core.wait(SUCCESS_DURATION - frame_interval)
+            
+            log_fp.flush()
+            
+            # ------------------------
+            # PHASE 4: ITI
+            # ------------------------
+            if trial_num + 1 < N_TRIALS:
+                next_trial = prepare_trial(trial_num + 1)
+            
+            stims.fixation.draw()
+            win.flip()
+            add_intended(ITI_DURATION)
+            core.wait(ITI_DURATION - frame_interval)
 
-# ------------------------
-# End
-# ------------------------
-end_text = visual.TextStim(
-    win,
-    text="Experiment Complete!\n\nThank you for participating.",
-    height=0.08,
-    color=FIXATION_COLOR
-)
-end_text.draw()
-win.flip()
-core.wait(2.0)
-
-# Save
-with open(log_file, "w", newline="") as f:
-    writer = csv.DictWriter(f, fieldnames=results[0].keys())
-    writer.writeheader()
-    writer.writerows(results)
-
-win.close()
-core.quit()
\ No newline at end of file
+        # ------------------------
+        # End
+        # ------------------------
+        stims.end_text.draw()
+        win.flip()
+        core.wait(2.0)
+    finally:
+        log_fp.close()
+
+    # --------------------------
+    # Frame timing check
+    # --------------------------
+    win.recordFrameIntervals = False
+    # The last interval runs from the final ITI to the end screen, which is
+    # built up front so it doesn't add to that ITI
+    intervals = list(zip(win.frameIntervals, intended))
+    with open(frame_log_file, "w", newline="") as fp:
+        writer = csv.writer(fp)
+        writer.writerow(("flip", "interval", "intended"))
+        writer.writerows((i, dt, hold) for i, (dt, hold) in enumerate(intervals))
+
+    # Each screen should last its own phase duration to within half a frame
+    mistimed = sum(abs(dt - hold) > frame_interval / 2 for dt, hold in intervals)
+    print(f"Frame timing: {mistimed} of {len(intervals)} screens off by more than half a frame")
+
+    win.close()
+    core.quit()
+
+
+if __name__ == '__main__':
+    main()
@@ -17,15 +17,46 @@ USAGE:
     - debug: Minimal trials for testing
 """
 
-from psychopy import visual, core, event, gui, data
+from psychopy import visual, core, event, gui
+from psychopy.hardware import keyboard
 import os
 import csv
+import bisect
+import functools
+import itertools
+import operator
+import numpy as np
 import random
 import time
 import sys
 from datetime import datetime
 from config import get_config, print_preset_info, list_presets
 
+# =============================================================================
+# TRIAL TYPES
+# =============================================================================
+
+# Trial types are int codes internally; names are only used in the CSV
+CORRECT, ERROR = 0, 1
+TRIAL_TYPE_NAMES = ('correct', 'error')
+
+# =============================================================================
+# DATA OUTPUT
+# =============================================================================
+
+# CSV column order
+FIELDNAMES = (
+    'subject_id', 'session_date', 'session_num', 'random_seed', 'block_num',
+    'trial_num', 'trial_type', 'error_type', 'target_x', 'target_y',
+    'cursor_start_x', 'cursor_start_y', 'cursor_end_x', 'cursor_end_y',
+    'movement_direction', 'trial_start_time', 'target_onset_time',
+    'movement_onset_time', 'movement_end_time', 'trial_end_time',
+    'response_key', 'response_time'
+)
+
+# Pulls a trial dict's values out in FIELDNAMES order (C-level, per row)
+trial_row = operator.itemgetter(*FIELDNAMES)
+
 # =============================================================================
 # HELPER FUNCTIONS
 # =============================================================================
@@ -59,89 +90,217 @@ def get_subject_info():
     Display GUI dialog to collect subject information.
     
     Returns:
-        dict: Subject information including ID, date, session number
+        dict: Subject information including ID, date, session number and
+        random seed (None if left blank)
     """
     exp_info = {
         'Subject ID': '',
         'Session Number': 1,
-        'Experimenter Name': ''
+        'Experimenter Name': '',
+        'Seed': ''
     }
     
     dlg = gui.DlgFromDict(
         dictionary=exp_info,
         title='Observation ErrP Experiment',
-        order=['Subject ID', 'Session Number', 'Experimenter Name']
+        order=['Subject ID', 'Session Number', 'Experimenter Name', 'Seed'],
+        tip={'Seed': 'Leave blank for a random session; enter a logged seed to replay one'}
     )
     
     if not dlg.OK:
         core.quit()  # User pressed cancel
     
-    # Add session date
-    exp_info['Session Date'] = datetime.now().strftime('%Y-%m-%d')
-    exp_info['Session Time'] = datetime.now().strftime('%H:%M:%S')
+    # Blank seed means a fresh random session
+    seed = str(exp_info['Seed']).strip()
+    try:
+        exp_info['Seed'] = int(seed) if seed else None
+    except ValueError:
+        print(f"Warning: Invalid seed '{seed}', using a random seed")
+        exp_info['Seed'] = None
+    
+    # Add session date and time (from one clock read)
+    session_start = datetime.now()
+    exp_info['Session Date'] = session_start.strftime('%Y-%m-%d')
+    exp_info['Session Time'] = session_start.strftime('%H:%M:%S')
     
     return exp_info
 
 
-def generate_trial_sequence(n_trials, error_rate, max_consec_errors=3, max_consec_correct=5):
+@functools.lru_cache(maxsize=None)
+def run_count_table(total, max_run, max_runs):
+    """
+    Count the ways to split trials into runs of bounded length (cached).
+    
+    Built row by row (each run added to the splits of the previous row), so
+    long blocks need neither deep recursion nor a recount per query.
+    
+    Args:
+        total: Largest number of trials to split
+        max_run: Maximum trials per run
+        max_runs: Largest number of runs to count
+    
+    Returns:
+        list: table[n_runs][n_trials] = number of distinct run-length lists
+    """
+    row = [1] + [0] * total
+    table = [row]
+    for _ in range(max_runs):
+        prev = row
+        row = [0] * (total + 1)
+        # Sliding sum of prev[t - max_run .. t - 1]
+        window = 0
+        for t in range(1, total + 1):
+            window += prev[t - 1]
+            if t > max_run:
+                window -= prev[t - 1 - max_run]
+            row[t] = window
+        table.append(row)
+    return table
+
+
+def weighted_index(weights, rng=random):
+    """
+    Pick an index with probability proportional to its weight.
+    
+    Weights are exact integers and may be too large for a float, so this
+    draws an integer below their sum rather than using rng.choices.
+    
+    Args:
+        weights: Non-negative integer weights (at least one positive)
+        rng: Random number source (random.Random or the random module)
+    
+    Returns:
+        int: Index of the chosen weight
+    """
+    cumulative = list(itertools.accumulate(weights))
+    return bisect.bisect_right(cumulative, rng.randrange(cumulative[-1]))
+
+
+def split_into_runs(total, n_runs, max_run, table, rng=random):
+    """
+    Randomly split a number of trials into runs of bounded length.
+    
+    Every valid split is equally likely.
+    
+    Args:
+        total: Number of trials to split
+        n_runs: Number of runs (each gets at least one trial)
+        max_run: Maximum trials per run
+        table: run_count_table() for at least total trials and n_runs runs
+        rng: Random number source (random.Random or the random module)
+    
+    Returns:
+        list: Run lengths, summing to total
+    """
+    runs = []
+    for runs_left in range(n_runs, 0, -1):
+        # Weight each length by the ways the remaining runs can be split
+        ways = table[runs_left - 1]
+        longest = min(max_run, total - runs_left + 1)
+        length = 1 + weighted_index([ways[total - n] for n in range(1, longest + 1)], rng)
+        runs.append(length)
+        total -= length
+    
+    return runs
+
+
+def generate_trial_sequence(n_trials, error_rate, max_consec_errors=3, max_consec_correct=5,
+                            rng=random):
     """
     Generate pseudorandom sequence of trial types with constraints.
     
+    The sequence is built directly as alternating runs of error and correct
+    trials, each no longer than its limit, so no reshuffling is needed. The
+    run counts are drawn in proportion to the number of sequences they
+    allow, so every valid sequence is equally likely (the same distribution
+    as reshuffling until the limits are met).
+    
     Args:
         n_trials: Total number of trials
         error_rate: Proportion of error trials (0-1)
         max_consec_errors: Maximum consecutive error trials
         max_consec_correct: Maximum consecutive correct trials
+        rng: Random number source (random.Random or the random module)
     
     Returns:
-        list: Sequence of trial types ('correct' or 'error')
+        list: Sequence of trial types (CORRECT or ERROR)
     """
     n_errors = int(n_trials * error_rate)
     n_correct = n_trials - n_errors
     
-    # Initialize sequence
-    sequence = ['correct'] * n_correct + ['error'] * n_errors
-    random.shuffle(sequence)
-    
-    # Enforce constraints
-    valid = False
-    attempts = 0
-    max_attempts = 1000
-    
-    while not valid and attempts < max_attempts:
-        valid = True
-        
-        # Check consecutive errors
-        error_count = 0
-        correct_count = 0
-        
-        for trial_type in sequence:
-            if trial_type == 'error':
-                error_count += 1
-                correct_count = 0
-                if error_count > max_consec_errors:
-                    valid = False
-                    break
-            else:
-                correct_count += 1
-                error_count = 0
-                if correct_count > max_consec_correct:
-                    valid = False
-                    break
-        
-        if not valid:
-            random.shuffle(sequence)
-            attempts += 1
+    # Runs alternate, so the two run counts differ by at most one and the
+    # class with more runs goes first (on a tie either may)
+    error_table = run_count_table(n_errors, max_consec_errors, n_errors)
+    correct_table = run_count_table(n_correct, max_consec_correct, min(n_correct, n_errors + 1))
+    layouts = []
+    weights = []
+    for n_error_runs in range(n_errors + 1):
+        error_ways = error_table[n_error_runs][n_errors]
+        if not error_ways:
+            continue
+        for n_correct_runs in range(max(n_error_runs - 1, 0),
+                                    min(n_error_runs + 1, len(correct_table) - 1) + 1):
+            ways = error_ways * correct_table[n_correct_runs][n_correct]
+            if not ways:
+                continue
+            if n_error_runs >= n_correct_runs:
+                layouts.append((ERROR, n_error_runs, n_correct_runs))
+                weights.append(ways)
+            if n_correct_runs >= n_error_runs:
+                layouts.append((CORRECT, n_error_runs, n_correct_runs))
+                weights.append(ways)
+    
+    if not layouts:
+        print("Warning: Trial counts cannot satisfy the consecutive-trial limits")
+        sequence = [CORRECT] * n_correct + [ERROR] * n_errors
+        rng.shuffle(sequence)
+        return sequence
+    
+    first_type, n_error_runs, n_correct_runs = layouts[weighted_index(weights, rng)]
+    error_runs = split_into_runs(n_errors, n_error_runs, max_consec_errors, error_table, rng)
+    correct_runs = split_into_runs(n_correct, n_correct_runs, max_consec_correct,
+                                   correct_table, rng)
+    
+    if first_type == ERROR:
+        first_runs, second_type, second_runs = error_runs, CORRECT, correct_runs
+    else:
+        first_runs, second_type, second_runs = correct_runs, ERROR, error_runs
     
-    if attempts >= max_attempts:
-        print(f"Warning: Could not generate valid sequence after {max_attempts} attempts")
+    sequence = []
+    for i, length in enumerate(first_runs):
+        sequence.extend([first_type] * length)
+        if i < len(second_runs):
+            sequence.extend([second_type] * second_runs[i])
     
     return sequence
 
 
-def generate_target_position(current_pos, n_positions, min_distance=3):
+def generate_all_trial_sequences(n_blocks, n_trials, error_rate,
+                                 max_consec_errors=3, max_consec_correct=5, rng=random):
+    """
+    Generate an independent trial sequence for every block up front.
+    
+    Args:
+        n_blocks: Number of blocks
+        n_trials: Trials per block
+        error_rate: Proportion of error trials (0-1)
+        max_consec_errors: Maximum consecutive error trials
+        max_consec_correct: Maximum consecutive correct trials
+        rng: Random number source (random.Random or the random module)
+    
+    Returns:
+        list: One trial sequence per block
+    """
+    return [
+        generate_trial_sequence(n_trials, error_rate, max_consec_errors, max_consec_correct, rng)
+        for _ in range(n_blocks)
+    ]
+
+
+@functools.lru_cache(maxsize=None)
+def get_target_candidates(current_pos, n_positions, min_distance=3):
     """
-    Generate random target position with minimum distance constraint.
+    Get valid target positions for a cursor position (cached).
     
     Args:
         current_pos: Current cursor position index
@@ -149,15 +308,15 @@ def generate_target_position(current_pos, n_positions, min_distance=3):
         min_distance: Minimum distance from current position
     
     Returns:
-        int: Target position index
+        tuple: Candidate target position indices
     """
-    possible_positions = [i for i in range(n_positions) 
-                         if abs(i - current_pos) >= min_distance]
+    possible_positions = tuple(i for i in range(n_positions) 
+                               if abs(i - current_pos) >= min_distance)
     
     if not possible_positions:
-        possible_positions = [i for i in range(n_positions) if i != current_pos]
+        possible_positions = tuple(i for i in range(n_positions) if i != current_pos)
     
-    return random.choice(possible_positions)
+    return possible_positions
 
 
 def determine_error_direction(correct_direction):
@@ -177,43 +336,21 @@ def determine_error_direction(correct_direction):
         return ('right', 'opposite')
 
 
-def get_unix_timestamp():
+def open_trial_log(filename):
     """
-    Get high-precision Unix timestamp.
-    
-    Returns:
-        float: Unix timestamp with microsecond precision
-    """
-    return time.time()
-
-
-def save_trial_data(filename, trial_data, exp_info):
-    """
-    Save trial data to CSV file.
+    Create the trial CSV file and write its header.
     
     Args:
         filename: Output CSV filename
-        trial_data: List of trial dictionaries
-        exp_info: Experiment information dictionary
-    """
-    # Ensure data directory exists
-    os.makedirs(os.path.dirname(filename), exist_ok=True)
-    
-    # Define column order
-    fieldnames = [
-        'subject_id', 'session_date', 'session_num', 'block_num', 'trial_num',
-        'trial_type', 'error_type', 'target_position', 'cursor_start', 'cursor_end',
-        'movement_direction', 'trial_start_time', 'target_onset_time',
-        'movement_onset_time', 'movement_end_time', 'trial_end_time',
-        'response_key', 'response_time'
-    ]
     
-    with open(filename, 'w', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(trial_data)
+    Returns:
+        tuple: (open file object, csv writer)
+    """
+    f = open(filename, 'w', newline='')
+    writer = csv.writer(f)
+    writer.writerow(FIELDNAMES)
     
-    print(f"\nData saved to: {filename}")
+    return f, writer
 
 
 # =============================================================================
@@ -223,12 +360,54 @@ def save_trial_data(filename, trial_data, exp_info):
 class ObservationErrPExperiment:
     """Main experiment class for Observation ErrP paradigm."""
     
+    # Fixed attribute set (no per-instance __dict__)
+    __slots__ = (
+        'exp_info', 'config', 'start_position_idx', 'last_position_idx',
+        'iti_min', 'iti_max', 'target_presentation', 'post_movement',
+        'show_target_reached', 'target_reached_duration', 'target_reached_color',
+        'target_color', 'experiment_start_time', 'seed', 'rng', 'trial_template',
+        'output_filename', 'win', 'frame_rate', 'cursor', 'target', 'fixation',
+        'instruction_text', 'block_counter', 'target_reached_text', 'positions',
+        'target_candidates', 'n_movement_frames', 'global_clock', 'kb'
+    )
+    
     def __init__(self, exp_info, config):
         """Initialize experiment with subject information and configuration."""
         self.exp_info = exp_info
         self.config = config
-        self.trial_data = []
-        self.experiment_start_time = get_unix_timestamp()
+        
+        # Settings read on every trial, copied out of the (read-only,
+        # chained) config once so run_trial uses plain attributes
+        self.start_position_idx = config['start_position_idx']
+        self.last_position_idx = config['n_positions'] - 1
+        self.iti_min = config['iti_min']
+        self.iti_max = config['iti_max']
+        self.target_presentation = config['target_presentation']
+        self.post_movement = config['post_movement']
+        self.show_target_reached = config['show_target_reached']
+        self.target_reached_duration = config['target_reached_duration']
+        self.target_reached_color = config['target_reached_color']
+        self.target_color = config['target_color']
+        self.experiment_start_time = time.time()
+        
+        # One seeded generator for every random draw in the session; the
+        # seed is logged with each trial so a session can be replayed by
+        # entering it in the subject dialog
+        self.seed = exp_info.get('Seed')
+        if self.seed is None:
+            self.seed = random.randrange(2**32)
+        self.rng = random.Random(self.seed)
+        
+        # Trial data fields that are the same for the whole session
+        self.trial_template = {
+            'subject_id': exp_info['Subject ID'],
+            'session_date': exp_info['Session Date'],
+            'session_num': exp_info['Session Number'],
+            'random_seed': self.seed,
+            'error_type': 'none',
+            'response_key': 'none',
+            'response_time': None
+        }
         
         # Create output filename
         self.output_filename = (
@@ -238,25 +417,44 @@ class ObservationErrPExperiment:
             f"task-observation_errp.csv"
         )
         
+        # Ensure data directory exists
+        os.makedirs(os.path.dirname(self.output_filename), exist_ok=True)
+        
         # Initialize PsychoPy window
         self.win = visual.Window(
             size=config['window_size'],
             units='pix',
             color=config['background_color'],
             fullscr=config['fullscreen'],
-            allowGUI=not config['fullscreen']
+            allowGUI=not config['fullscreen'],
+            checkTiming=False  # frame rate is measured once below
         )
         
         self.win.mouseVisible = False
         
+        # Measured refresh rate, used to turn durations into frame counts
+        self.frame_rate = self.win.getActualFrameRate() or 60.0
+        
         # Create stimulus objects
         self.create_stimuli()
         
         # Generate spatial positions
         self.positions = self.generate_positions()
         
+        # The cursor always starts at the same index, so the valid targets
+        # are the same for every trial
+        self.target_candidates = get_target_candidates(
+            config['start_position_idx'], config['n_positions']
+        )
+        
+        # Frames per cursor movement
+        self.n_movement_frames = round(config['movement_duration'] * self.frame_rate)
+        
         # Initialize clocks
         self.global_clock = core.Clock()
+        
+        # Keyboard for ESC checks (event-driven, no per-call queue scan)
+        self.kb = keyboard.Keyboard()
     
     def create_stimuli(self):
         """Create all visual stimulus objects."""
@@ -319,12 +517,29 @@ class ObservationErrPExperiment:
         margin = 100  # pixels from edge
         usable_width = screen_width - 2 * margin
         
-        positions = []
-        for i in range(self.config['n_positions']):
-            x = -usable_width/2 + i * (usable_width / (self.config['n_positions'] - 1))
-            positions.append(x)
+        return np.linspace(-usable_width/2, usable_width/2, self.config['n_positions'])
+    
+    def check_escape(self):
+        """Quit the experiment if ESC has been pressed."""
+        if self.kb.getKeys(['escape'], waitRelease=False):
+            self.cleanup()
+            core.quit()
+    
+    def hold_frames(self, duration, *stims):
+        """
+        Show a scene for a whole number of frames, so the next scene's onset
+        lands on the refresh grid. The back buffer is undefined after a
+        swap, so the stims are redrawn before every flip.
         
-        return positions
+        Args:
+            duration: Time to show the scene for (seconds)
+            *stims: Stimuli making up the scene, drawn in order
+        """
+        n_frames = max(1, round(duration * self.frame_rate))
+        for _ in range(n_frames):
+            for stim in stims:
+                stim.draw()
+            self.win.flip()
     
     def show_instructions(self, is_practice=False):
         """Display experiment instructions."""
@@ -392,55 +607,53 @@ class ObservationErrPExperiment:
         Args:
             trial_num: Trial number within block
             block_num: Current block number
-            trial_type: 'correct' or 'error'
+            trial_type: CORRECT or ERROR
             is_practice: Whether this is a practice trial
         
         Returns:
             dict: Trial data
         """
+        # Unix timestamps for the log; bound once for the trial's five reads
+        now = time.time
+        
         # Initialize trial data
-        trial_info = {
-            'subject_id': self.exp_info['Subject ID'],
-            'session_date': self.exp_info['Session Date'],
-            'session_num': self.exp_info['Session Number'],
-            'block_num': block_num,
-            'trial_num': trial_num,
-            'trial_type': trial_type,
-            'error_type': 'none',
-            'response_key': 'none',
-            'response_time': None
-        }
+        trial_info = self.trial_template.copy()
+        trial_info['block_num'] = block_num
+        trial_info['trial_num'] = trial_num
+        trial_info['trial_type'] = TRIAL_TYPE_NAMES[trial_type]
         
         # Check for escape
-        if event.getKeys(['escape']):
-            self.cleanup()
-            core.quit()
+        self.check_escape()
         
         # Record trial start
-        trial_info['trial_start_time'] = get_unix_timestamp()
+        trial_info['trial_start_time'] = now()
         
-        # PHASE 1: Inter-Trial Interval (ITI)
-        iti_duration = random.uniform(self.config['iti_min'], self.config['iti_max'])
-        self.fixation.draw()
-        self.win.flip()
-        core.wait(iti_duration)
-        
-        # PHASE 2: Target Presentation
-        cursor_start_idx = self.config['start_position_idx']
-        target_idx = generate_target_position(cursor_start_idx, self.config['n_positions'])
+        # The target is placed before the ITI so its static snapshot is
+        # ready before anything is timed on screen
+        cursor_start_idx = self.start_position_idx
+        target_idx = self.rng.choice(self.target_candidates)
         
         self.cursor.pos = (self.positions[cursor_start_idx], 0)
         self.target.pos = (self.positions[target_idx], 0)
         
-        trial_info['cursor_start'] = f"({self.positions[cursor_start_idx]}, 0)"
-        trial_info['target_position'] = f"({self.positions[target_idx]}, 0)"
+        # The target doesn't move for the rest of the trial, so render it
+        # once and blit the texture on every animation frame
+        static_scene = visual.BufferImageStim(self.win, stim=[self.target])
+        
+        # PHASE 1: Inter-Trial Interval (ITI)
+        iti_duration = self.rng.uniform(self.iti_min, self.iti_max)
+        self.hold_frames(iti_duration, self.fixation)
+        
+        # PHASE 2: Target Presentation
+        # Positions are logged as plain x/y numbers (movement is horizontal)
+        trial_info['cursor_start_x'] = float(self.positions[cursor_start_idx])
+        trial_info['cursor_start_y'] = 0.0
+        trial_info['target_x'] = float(self.positions[target_idx])
+        trial_info['target_y'] = 0.0
         
         # Show target
-        trial_info['target_onset_time'] = get_unix_timestamp()
-        self.target.draw()
-        self.cursor.draw()
-        self.win.flip()
-        core.wait(self.config['target_presentation'])
+        trial_info['target_onset_time'] = now()
+        self.hold_frames(self.target_presentation, self.target, self.cursor)
         
         # PHASE 3: Movement
         # Determine correct direction
@@ -452,7 +665,7 @@ class ObservationErrPExperiment:
             correct_end_idx = cursor_start_idx - 1
         
         # Determine actual movement based on trial type
-        if trial_type == 'error':
+        if trial_type == ERROR:
             actual_direction, error_type = determine_error_direction(correct_direction)
             trial_info['error_type'] = error_type
             
@@ -465,49 +678,47 @@ class ObservationErrPExperiment:
             cursor_end_idx = correct_end_idx
         
         # Ensure cursor stays within bounds
-        cursor_end_idx = max(0, min(self.config['n_positions'] - 1, cursor_end_idx))
+        cursor_end_idx = max(0, min(self.last_position_idx, cursor_end_idx))
         
         trial_info['movement_direction'] = actual_direction
-        trial_info['cursor_end'] = f"({self.positions[cursor_end_idx]}, 0)"
+        trial_info['cursor_end_x'] = float(self.positions[cursor_end_idx])
+        trial_info['cursor_end_y'] = 0.0
         
         # Animate movement
-        trial_info['movement_onset_time'] = get_unix_timestamp()
+        trial_info['movement_onset_time'] = now()
         
         start_pos = self.positions[cursor_start_idx]
         end_pos = self.positions[cursor_end_idx]
         
-        # Smooth animation
-        n_frames = int(self.config['movement_duration'] * 60)  # Assuming 60 Hz refresh
-        for frame in range(n_frames):
-            t = frame / n_frames
-            current_x = start_pos + t * (end_pos - start_pos)
-            
-            self.cursor.pos = (current_x, 0)
-            self.target.draw()
+        # Smooth animation (every frame's (x, 0) position computed up front)
+        n_frames = self.n_movement_frames
+        trajectory = np.zeros((n_frames, 2))
+        trajectory[:, 0] = np.linspace(start_pos, end_pos, n_frames, endpoint=False)
+        for frame, pos in enumerate(trajectory):
+            self.cursor.pos = pos
+            static_scene.draw()
             self.cursor.draw()
             self.win.flip()
+            
+            # Keep ESC responsive mid-movement without polling every frame
+            if frame % 10 == 0:
+                self.check_escape()
         
-        trial_info['movement_end_time'] = get_unix_timestamp()
+        trial_info['movement_end_time'] = now()
         
         # PHASE 4: Post-Movement
         self.cursor.pos = (self.positions[cursor_end_idx], 0)
-        self.target.draw()
-        self.cursor.draw()
-        self.win.flip()
-        core.wait(self.config['post_movement'])
+        self.hold_frames(self.post_movement, static_scene, self.cursor)
         
         # PHASE 5: Target Reached Feedback (optional)
-        if self.config['show_target_reached'] and cursor_end_idx == target_idx:
-            self.target.fillColor = self.config['target_reached_color']
-            self.target.draw()
-            self.cursor.draw()
-            self.target_reached_text.draw()
-            self.win.flip()
-            core.wait(self.config['target_reached_duration'])
-            self.target.fillColor = self.config['target_color']  # Reset color
+        if self.show_target_reached and cursor_end_idx == target_idx:
+            self.target.fillColor = self.target_reached_color
+            self.hold_frames(self.target_reached_duration,
+                             self.target, self.cursor, self.target_reached_text)
+            self.target.fillColor = self.target_color  # Reset color
         
         # Record trial end
-        trial_info['trial_end_time'] = get_unix_timestamp()
+        trial_info['trial_end_time'] = now()
         
         return trial_info
     
@@ -520,7 +731,8 @@ class ObservationErrPExperiment:
             self.config['n_practice_trials'],
             self.config['error_rate'],
             self.config['max_consecutive_errors'],
-            self.config['max_consecutive_correct']
+            self.config['max_consecutive_correct'],
+            self.rng
         )
         
         for trial_num, trial_type in enumerate(trial_sequence, 1):
@@ -538,45 +750,54 @@ class ObservationErrPExperiment:
     
     def run_experiment(self):
         """Run the complete experiment."""
+        # All blocks' sequences are drawn before the session starts
+        block_sequences = generate_all_trial_sequences(
+            self.config['n_blocks'],
+            self.config['n_trials_per_block'],
+            self.config['error_rate'],
+            self.config['max_consecutive_errors'],
+            self.config['max_consecutive_correct'],
+            self.rng
+        )
+        
         # Show instructions
         self.show_instructions(is_practice=False)
         
         # Run practice block
         self.run_practice_block()
         
-        # Run experimental blocks
-        for block_num in range(1, self.config['n_blocks'] + 1):
-            # Generate trial sequence for this block
-            trial_sequence = generate_trial_sequence(
-                self.config['n_trials_per_block'],
-                self.config['error_rate'],
-                self.config['max_consecutive_errors'],
-                self.config['max_consecutive_correct']
-            )
-            
-            # Block start message
-            self.instruction_text.text = (
-                f"Block {block_num} of {self.config['n_blocks']}\n\n"
-                f"Press SPACE to begin"
-            )
-            self.instruction_text.draw()
-            self.win.flip()
-            event.waitKeys(keyList=['space'])
-            
-            # Run trials in block
-            for trial_num, trial_type in enumerate(trial_sequence, 1):
-                trial_data = self.run_trial(trial_num, block_num, trial_type)
-                self.trial_data.append(trial_data)
+        # Trials are written as soon as they finish, so a session aborted
+        # with ESC keeps every completed trial
+        log_file, log_writer = open_trial_log(self.output_filename)
+        
+        try:
+            # Run experimental blocks
+            for block_num, trial_sequence in enumerate(block_sequences, 1):
+                # Block start message
+                self.instruction_text.text = (
+                    f"Block {block_num} of {self.config['n_blocks']}\n\n"
+                    f"Press SPACE to begin"
+                )
+                self.instruction_text.draw()
+                self.win.flip()
+                event.waitKeys(keyList=['space'])
+                
+                # Run trials in block
+                for trial_num, trial_type in enumerate(trial_sequence, 1):
+                    trial_data = self.run_trial(trial_num, block_num, trial_type)
+                    log_writer.writerow(trial_row(trial_data))
+                    log_file.flush()
+                
+                # Show break screen (except after last block)
+                if block_num < self.config['n_blocks']:
+                    self.show_break_screen(block_num, self.config['n_blocks'])
             
-            # Show break screen (except after last block)
-            if block_num < self.config['n_blocks']:
-                self.show_break_screen(block_num, self.config['n_blocks'])
+            # Experiment complete
+            self.show_completion_message()
+        finally:
+            log_file.close()
         
-        # Experiment complete
-        self.show_completion_message()
-        
-        # Save data
-        save_trial_data(self.output_filename, self.trial_data, self.exp_info)
+        print(f"\nData saved to: {self.output_filename}")
         
         # Cleanup
         self.cleanup()
@@ -588,9 +809,7 @@ class ObservationErrPExperiment:
             "Thank you for participating.\n\n"
             "Please inform the experimenter."
         )
-        self.instruction_text.draw()
-        self.win.flip()
-        core.wait(3.0)
+        self.hold_frames(3.0, self.instruction_text)
     
     def cleanup(self):
         """Clean up and close experiment."""
@@ -1,8 +1,4 @@
-# bug: skips through the introductary instructions
-
-from psychopy import visual, core, event
-import pygame
-import os, csv, random, math
+import os, csv, math
 
 # --------------------------
 # Experiment parameters (Iwane et al. 2023)
@@ -16,6 +12,8 @@ BOUNDARY_MIN = 0.30  # Rotation occurs between 30-60% of distance
 BOUNDARY_MAX = 0.60
 SUCCESS_DURATION = 1.0
 ITI_DURATION = 0.5
+RANDOM_SEED = None  # set to an int to replay the same trial schedule
+INPUT_POLL_INTERVAL = 1.0 / 60  # Input polling period on static screens
 
 # --------------------------
 # Visual parameters
@@ -29,6 +27,7 @@ FIXATION_COLOR = [0.9, 0.9, 0.9]
 
 CURSOR_RADIUS = 0.04
 TARGET_SIZE = 0.08
+REACH_THRESH_SQ = (TARGET_SIZE + CURSOR_RADIUS) ** 2  # squared reach distance
 
 # --------------------------
 # Input method selection
@@ -51,6 +50,12 @@ while True:
     else:
         print("Invalid choice. Please enter 1 or 2.")
 
+# PsychoPy and pygame are slow to import (OpenGL, SDL, numpy), so only
+# load them once the input method has been chosen
+from psychopy import visual, core, event
+import numpy as np
+import pygame
+
 # --------------------------
 # Joystick setup (if using controller)
 # --------------------------
@@ -76,13 +81,6 @@ else:
     print("Use Arrow Keys to move the cursor")
     print("Press SPACE to start trials")
 
-# --------------------------
-# Keyboard state tracking (if using keyboard)
-# --------------------------
-# We'll use pygame's key state for smooth continuous movement
-if not USE_CONTROLLER:
-    pygame.key.set_repeat(1, 1)  # Enable key repeat for smooth movement
-
 # --------------------------
 # Window setup
 # --------------------------
@@ -147,6 +145,60 @@ instruction_text = visual.TextStim(
     wrapWidth=1.6
 )
 
+# Questionnaire shown after error trials (built once, drawn per error trial)
+question_text = visual.TextStim(
+    win,
+    text="Did you perceive a rotation in the cursor control?",
+    height=0.07,
+    color=TEXT_COLOR,
+    pos=(0, 0.3)
+)
+
+yes_btn = visual.Rect(
+    win,
+    width=0.3,
+    height=0.15,
+    fillColor=SUCCESS_COLOR,
+    pos=(-0.4, -0.1)
+)
+yes_text = visual.TextStim(
+    win,
+    text="Yes\n(Y key)",
+    height=0.06,
+    color=[-0.8, -0.8, -0.8],
+    pos=(-0.4, -0.1)
+)
+
+maybe_btn = visual.Rect(
+    win,
+    width=0.3,
+    height=0.15,
+    fillColor=TARGET_COLOR,
+    pos=(0, -0.1)
+)
+maybe_text = visual.TextStim(
+    win,
+    text="Maybe\n(M key)",
+    height=0.06,
+    color=[0.9, 0.9, 0.9],
+    pos=(0, -0.1)
+)
+
+no_btn = visual.Rect(
+    win,
+    width=0.3,
+    height=0.15,
+    fillColor=[0.3, 0.3, 0.3],
+    pos=(0.4, -0.1)
+)
+no_text = visual.TextStim(
+    win,
+    text="No\n(N key)",
+    height=0.06,
+    color=[0.9, 0.9, 0.9],
+    pos=(0.4, -0.1)
+)
+
 # --------------------------
 # Instruction screens
 # --------------------------
@@ -210,22 +262,11 @@ def show_instructions():
         instruction_text.draw()
         win.flip()
 
-        # Wait for button press
+        # Wait for a new button press (any controller button)
+        pygame.event.clear()
         waiting = True
         while waiting:
-            if USE_CONTROLLER:
-                pygame.event.pump()
-                for i in range(joystick.get_numbuttons()):
-                    if joystick.get_button(i):
-                        waiting = False
-                        core.wait(0.3)  # Debounce
-                        break
-            else:
-                pygame.event.pump()
-                keys_pressed = pygame.key.get_pressed()
-                if keys_pressed[pygame.K_SPACE]:
-                    waiting = False
-                    core.wait(0.3)  # Debounce
+            waiting = not start_pressed(any_button=True)
 
             # Check for escape in both modes
             keys = event.getKeys(['escape'])
@@ -234,62 +275,14 @@ def show_instructions():
                 pygame.quit()
                 core.quit()
 
+            # Nothing is redrawn here, so poll once per frame period
+            # rather than spinning on the event queue
+            if waiting:
+                core.wait(INPUT_POLL_INTERVAL, hogCPUperiod=0)
+
 def show_questionnaire():
     """Show questionnaire after error trials."""
-    question = visual.TextStim(
-        win,
-        text="Did you perceive a rotation in the cursor control?",
-        height=0.07,
-        color=TEXT_COLOR,
-        pos=(0, 0.3)
-    )
-    
-    yes_btn = visual.Rect(
-        win,
-        width=0.3,
-        height=0.15,
-        fillColor=SUCCESS_COLOR,
-        pos=(-0.4, -0.1)
-    )
-    yes_text = visual.TextStim(
-        win,
-        text="Yes\n(Y key)",
-        height=0.06,
-        color=[-0.8, -0.8, -0.8],
-        pos=(-0.4, -0.1)
-    )
-    
-    maybe_btn = visual.Rect(
-        win,
-        width=0.3,
-        height=0.15,
-        fillColor=TARGET_COLOR,
-        pos=(0, -0.1)
-    )
-    maybe_text = visual.TextStim(
-        win,
-        text="Maybe\n(M key)",
-        height=0.06,
-        color=[0.9, 0.9, 0.9],
-        pos=(0, -0.1)
-    )
-    
-    no_btn = visual.Rect(
-        win,
-        width=0.3,
-        height=0.15,
-        fillColor=[0.3, 0.3, 0.3],
-        pos=(0.4, -0.1)
-    )
-    no_text = visual.TextStim(
-        win,
-        text="No\n(N key)",
-        height=0.06,
-        color=[0.9, 0.9, 0.9],
-        pos=(0.4, -0.1)
-    )
-    
-    question.draw()
+    question_text.draw()
     yes_btn.draw()
     yes_text.draw()
     maybe_btn.draw()
@@ -316,46 +309,42 @@ def show_questionnaire():
             win.close()
             pygame.quit()
             core.quit()
+        else:
+            core.wait(INPUT_POLL_INTERVAL, hogCPUperiod=0)
     
     return response
 
 # --------------------------
 # Helper functions
 # --------------------------
-def get_keyboard_input():
-    """Get keyboard arrow key input and spacebar press."""
-    pygame.event.pump()  # Process event queue
-
-    x = 0
-    y = 0
-    button_pressed = False
+# Key codes read every frame, resolved from the pygame namespace once
+KEY_LEFT, KEY_RIGHT, KEY_UP, KEY_DOWN, KEY_SPACE, KEY_ESCAPE = (
+    pygame.K_LEFT, pygame.K_RIGHT, pygame.K_UP, pygame.K_DOWN, pygame.K_SPACE,
+    pygame.K_ESCAPE
+)
 
+def get_keyboard_input():
+    """Get keyboard arrow key input, spacebar press and escape press."""
     # Get current state of all keys
     keys = pygame.key.get_pressed()
 
-    # Arrow keys for movement
-    if keys[pygame.K_LEFT]:
-        x = -1.0
-    if keys[pygame.K_RIGHT]:
-        x = 1.0
-    if keys[pygame.K_UP]:
-        y = 1.0  # Up = positive Y in normalized coordinates
-    if keys[pygame.K_DOWN]:
-        y = -1.0  # Down = negative Y in normalized coordinates
+    # Arrow keys for movement (up = positive Y in normalized coordinates);
+    # opposite keys held together cancel out
+    x = float(keys[KEY_RIGHT] - keys[KEY_LEFT])
+    y = float(keys[KEY_UP] - keys[KEY_DOWN])
 
-    # Check for spacebar
-    if keys[pygame.K_SPACE]:
-        button_pressed = True
+    return x, y, bool(keys[KEY_SPACE]), bool(keys[KEY_ESCAPE])
 
-    return x, y, button_pressed
+# Joystick methods read every frame, bound once (controller mode only)
+if USE_CONTROLLER:
+    joy_get_axis = joystick.get_axis
+    joy_get_button = joystick.get_button
 
 def get_joystick_input():
-    """Get joystick axis values and button press."""
-    pygame.event.pump()
-
+    """Get joystick axis values, button press and escape press."""
     # Left stick (axes 0, 1)
-    x = joystick.get_axis(0)
-    y = joystick.get_axis(1)
+    x = joy_get_axis(0)
+    y = joy_get_axis(1)
 
     # Apply deadzone
     if abs(x) < 0.15:
@@ -364,17 +353,35 @@ def get_joystick_input():
         y = 0
 
     # Check for button press (button 0 = A on Xbox, Cross on PS)
-    button_pressed = joystick.get_button(0)
+    button_pressed = joy_get_button(0)
 
-    return x, y, button_pressed
+    # Escape still comes from the keyboard (via the PsychoPy window)
+    escape_pressed = bool(event.getKeys(['escape']))
+
+    return x, y, button_pressed, escape_pressed
 
 def get_input():
-    """Get input from either keyboard or controller based on settings."""
+    """Get input from keyboard or controller (drain pygame events first)."""
     if USE_CONTROLLER:
         return get_joystick_input()
     else:
         return get_keyboard_input()
 
+# Waiting on press events for the start key/button (rather than the held
+# state) means a press only counts once, so a key still held from the
+# previous screen can't skip the next one. The whole queue is drained on
+# every check: SDL drops new events once it is full, so leftover axis and
+# button-up events would otherwise swallow the press being waited for.
+def start_pressed(any_button=False):
+    """Check for a SPACE / A-button press since the last call."""
+    for ev in pygame.event.get():
+        if USE_CONTROLLER:
+            if ev.type == pygame.JOYBUTTONDOWN and (any_button or ev.button == 0):
+                return True
+        elif ev.type == pygame.KEYDOWN and ev.key == KEY_SPACE:
+            return True
+    return False
+
 def wait_for_button():
     """Wait for button press to start trial."""
     if USE_CONTROLLER:
@@ -382,52 +389,79 @@ def wait_for_button():
     else:
         instruction_text.text = "Press SPACE to start trial"
     instruction_text.pos = (0, 0)
+    instruction_text.draw()
+    win.flip()
 
+    pygame.event.clear()
     waiting = True
     while waiting:
-        instruction_text.draw()
-        win.flip()
-
-        if USE_CONTROLLER:
-            pygame.event.pump()
-            if joystick.get_button(0):
-                waiting = False
-                core.wait(0.3)  # Debounce
-        else:
-            pygame.event.pump()
-            keys_pressed = pygame.key.get_pressed()
-            if keys_pressed[pygame.K_SPACE]:
-                waiting = False
-                core.wait(0.3)  # Debounce
+        waiting = not start_pressed()
 
         # Check for escape in both modes
         keys = event.getKeys(['escape'])
         if 'escape' in keys:
             return False
 
-    return True
+        if waiting:
+            core.wait(INPUT_POLL_INTERVAL, hogCPUperiod=0)
 
-def apply_rotation(angle_rad, rotation_angle_deg):
-    """Apply rotation to input angle."""
-    rotation_rad = math.radians(rotation_angle_deg)
-    return angle_rad + rotation_rad
+    return True
 
 # --------------------------
 # Logging setup
 # --------------------------
 os.makedirs("data/logs", exist_ok=True)
 log_file = "data/logs/task2_feedback_errp_log.csv"
-results = []
+LOG_FIELDS = (
+    'time', 'trial', 'is_error_trial', 'rotation_angle', 'rotation_onset_time',
+    'trial_duration', 'movement_duration', 'cursor_start_x', 'cursor_start_y',
+    'target_x', 'target_y', 'boundary_x', 'perceived_rotation'
+)
+
+# Each trial's row is written (and flushed) as soon as the trial ends, so a
+# session that is quit early still leaves every completed trial on disk
+log_fp = open(log_file, "w", newline="")
+log_writer = csv.writer(log_fp)
+log_writer.writerow(LOG_FIELDS)
+n_completed = 0
+
+# Per-frame movement samples, one row per frame in TRAJECTORY_FIELDS order.
+# The buffer is reused for every trial and doubled if a trial outgrows it.
+TRAJECTORY_FIELDS = (
+    'time', 'cursor_x', 'cursor_y', 'joystick_x', 'joystick_y', 'rotation_active'
+)
+trajectory = np.empty((4096, len(TRAJECTORY_FIELDS)))
 global_clock = core.Clock()
+frame_clock = core.Clock()  # For delta time calculation
 
 # --------------------------
 # Show instructions
 # --------------------------
 show_instructions()
 
+# --------------------------
+# Trial schedule (all randomization drawn before the first trial)
+# --------------------------
+rng = np.random.default_rng(RANDOM_SEED)
+error_trials = rng.random(N_TRIALS) < ERROR_PROBABILITY
+# Signed rotation magnitude (only applied on error trials)
+rotation_angles = rng.choice(ROTATION_ANGLES, N_TRIALS) * rng.choice((-1, 1), N_TRIALS)
+start_left = rng.random(N_TRIALS) < 0.5
+cursor_start_ys = rng.uniform(-0.3, 0.3, N_TRIALS)
+target_ys = rng.uniform(-0.3, 0.3, N_TRIALS)
+boundary_ratios = rng.uniform(BOUNDARY_MIN, BOUNDARY_MAX, N_TRIALS)
+
 # --------------------------
 # Main experiment loop
 # --------------------------
+# Per-frame draw calls, bound once (the stims persist across trials)
+draw_target = target.draw
+draw_cursor = cursor.draw
+draw_counter = trial_counter.draw
+flip = win.flip
+get_time = global_clock.getTime
+drain_events = pygame.event.get
+
 for trial_num in range(N_TRIALS):
     
     # Check for escape
@@ -442,26 +476,28 @@ for trial_num in range(N_TRIALS):
     # ------------------------
     # Trial setup
     # ------------------------
-    is_error_trial = random.random() < ERROR_PROBABILITY
-    rotation_angle = 0
-    
-    if is_error_trial:
-        rotation_angle = random.choice(ROTATION_ANGLES)
-        # Randomly choose positive or negative rotation
-        rotation_angle *= random.choice([-1, 1])
+    is_error_trial = bool(error_trials[trial_num])
+    rotation_angle = int(rotation_angles[trial_num]) if is_error_trial else 0
     
     # Random cursor start position (left or right side)
-    side = random.choice(['left', 'right'])
+    side = 'left' if start_left[trial_num] else 'right'
+    cursor_y = float(cursor_start_ys[trial_num])
+    target_y = float(target_ys[trial_num])
     if side == 'left':
-        cursor_pos = [-0.7, random.uniform(-0.3, 0.3)]
-        target_pos = [0.7, random.uniform(-0.3, 0.3)]
+        cursor_pos = [-0.7, cursor_y]
+        target_pos = [0.7, target_y]
     else:
-        cursor_pos = [0.7, random.uniform(-0.3, 0.3)]
-        target_pos = [-0.7, random.uniform(-0.3, 0.3)]
+        cursor_pos = [0.7, cursor_y]
+        target_pos = [-0.7, target_y]
+    
+    # Rotation matrix terms (constant for the trial)
+    rotation_rad = math.radians(rotation_angle)
+    rot_cos = math.cos(rotation_rad)
+    rot_sin = math.sin(rotation_rad)
     
     # Calculate rotation boundary
     distance = abs(target_pos[0] - cursor_pos[0])
-    boundary_ratio = random.uniform(BOUNDARY_MIN, BOUNDARY_MAX)
+    boundary_ratio = float(boundary_ratios[trial_num])
     boundary_x = cursor_pos[0] + (target_pos[0] - cursor_pos[0]) * boundary_ratio
     
     # Set positions
@@ -475,7 +511,7 @@ for trial_num in range(N_TRIALS):
     rotation_onset_time = None
     trial_start_time = global_clock.getTime()
     movement_start_time = None
-    trajectory = []
+    n_samples = 0
     
     trial_counter.text = f"Trial {trial_num + 1} / {N_TRIALS}"
     
@@ -483,31 +519,35 @@ for trial_num in range(N_TRIALS):
     # Movement phase
     # ------------------------
     reached_target = False
-    frame_clock = core.Clock()  # For delta time calculation
+    frame_clock.reset()
 
     while not reached_target:
         # Calculate delta time for frame-rate independent movement
         dt = frame_clock.getTime()
         frame_clock.reset()
-        # Get input (from controller or keyboard)
-        joy_x, joy_y, button = get_input()
+        now = get_time()  # one timestamp for everything logged this frame
+        # Get input (from controller or keyboard). Draining the event queue
+        # once per frame updates the key/joystick state and keeps the queue
+        # from filling up with axis motion events.
+        drain_events()
+        joy_x, joy_y, button, escape = get_input()
         
         # Check for escape
-        keys = event.getKeys(['escape'])
-        if 'escape' in keys:
+        if escape:
             win.close()
             pygame.quit()
             core.quit()
         
+        moving = abs(joy_x) > 0.1 or abs(joy_y) > 0.1
+        
         # Record movement start
-        if movement_start_time is None and (abs(joy_x) > 0.1 or abs(joy_y) > 0.1):
-            movement_start_time = global_clock.getTime()
+        if movement_start_time is None and moving:
+            movement_start_time = now
         
-        # Calculate input angle and magnitude
-        if abs(joy_x) > 0.1 or abs(joy_y) > 0.1:
-            input_angle = math.atan2(joy_y, joy_x)
-            magnitude = math.sqrt(joy_x**2 + joy_y**2)
-            magnitude = min(magnitude, 1.0)
+        # Calculate input magnitude (the cursor, and so its stim
+        # position, only changes while there is input)
+        if moving:
+            magnitude = math.hypot(joy_x, joy_y)
             
             # Check if crossed boundary (trigger rotation)
             # If moving right (left->right), check if cursor_x >= boundary_x
@@ -519,47 +559,50 @@ for trial_num in range(N_TRIALS):
 
             if is_error_trial and not rotation_active and crossed_boundary:
                 rotation_active = True
-                rotation_onset_time = global_clock.getTime()
+                rotation_onset_time = now
             
-            # Apply rotation if active
+            # Apply rotation if active (2x2 rotation of the input vector)
             if rotation_active:
-                input_angle = apply_rotation(input_angle, rotation_angle)
+                move_x = rot_cos * joy_x - rot_sin * joy_y
+                move_y = rot_sin * joy_x + rot_cos * joy_y
+            else:
+                move_x, move_y = joy_x, joy_y
 
-            # Move cursor (frame-rate independent)
-            speed = magnitude * CURSOR_SPEED * dt
-            cursor_pos[0] += math.cos(input_angle) * speed
-            cursor_pos[1] += math.sin(input_angle) * speed
+            # Move cursor (frame-rate independent); input beyond unit
+            # length doesn't go any faster
+            speed = min(magnitude, 1.0) / magnitude * CURSOR_SPEED * dt
+            cursor_pos[0] += move_x * speed
+            cursor_pos[1] += move_y * speed
             
             # Keep cursor on screen
-            cursor_pos[0] = max(-0.95, min(0.95, cursor_pos[0]))
-            cursor_pos[1] = max(-0.95, min(0.95, cursor_pos[1]))
+            cx, cy = cursor_pos
+            cursor_pos[0] = -0.95 if cx < -0.95 else 0.95 if cx > 0.95 else cx
+            cursor_pos[1] = -0.95 if cy < -0.95 else 0.95 if cy > 0.95 else cy
             
             cursor.pos = cursor_pos
             
             # Record trajectory
-            trajectory.append({
-                'time': global_clock.getTime(),
-                'cursor_x': cursor_pos[0],
-                'cursor_y': cursor_pos[1],
-                'joystick_x': joy_x,
-                'joystick_y': joy_y,
-                'rotation_active': rotation_active
-            })
+            if n_samples == len(trajectory):
+                trajectory = np.concatenate((trajectory, np.empty_like(trajectory)))
+            trajectory[n_samples] = (
+                now, cursor_pos[0], cursor_pos[1],
+                joy_x, joy_y, rotation_active
+            )
+            n_samples += 1
         
         # Check if reached target
         dx = cursor_pos[0] - target_pos[0]
         dy = cursor_pos[1] - target_pos[1]
-        distance_to_target = math.sqrt(dx**2 + dy**2)
         
-        if distance_to_target < (TARGET_SIZE + CURSOR_RADIUS):
+        if dx * dx + dy * dy < REACH_THRESH_SQ:
             reached_target = True
-            trial_end_time = global_clock.getTime()
+            trial_end_time = now
         
         # Draw
-        target.draw()
-        cursor.draw()
-        trial_counter.draw()
-        win.flip()
+        draw_target()
+        draw_cursor()
+        draw_counter()
+        flip()
     
     # ------------------------
     # Success feedback
@@ -567,55 +610,52 @@ for trial_num in range(N_TRIALS):
     target.fillColor = SUCCESS_COLOR
     cursor.fillColor = SUCCESS_COLOR
     
-    clock = core.Clock()
-    while clock.getTime() < SUCCESS_DURATION:
-        target.draw()
-        cursor.draw()
-        success_text.draw()
-        trial_counter.draw()
-        win.flip()
+    # Static screen: draw and flip once, then hold it
+    target.draw()
+    cursor.draw()
+    success_text.draw()
+    trial_counter.draw()
+    win.flip()
+    core.wait(SUCCESS_DURATION)
     
     # Reset colors
     cursor.fillColor = CURSOR_COLOR
     
     # ------------------------
-    # Log trial data
+    # Questionnaire (error trials only)
     # ------------------------
-    trial_duration = trial_end_time - trial_start_time
-    movement_duration = trial_end_time - movement_start_time if movement_start_time else 0
-    
-    trial_data = {
-        'time': trial_start_time,
-        'trial': trial_num,
-        'is_error_trial': int(is_error_trial),
-        'rotation_angle': rotation_angle if is_error_trial else 0,
-        'rotation_onset_time': rotation_onset_time if rotation_active else None,
-        'trial_duration': trial_duration,
-        'movement_duration': movement_duration,
-        'cursor_start_x': trajectory[0]['cursor_x'] if trajectory else cursor_pos[0],
-        'cursor_start_y': trajectory[0]['cursor_y'] if trajectory else cursor_pos[1],
-        'target_x': target_pos[0],
-        'target_y': target_pos[1],
-        'boundary_x': boundary_x,
-        'perceived_rotation': None
-    }
+    perceived_rotation = show_questionnaire() if is_error_trial else None
     
     # ------------------------
-    # Questionnaire (error trials only)
+    # Log trial data
     # ------------------------
-    if is_error_trial:
-        response = show_questionnaire()
-        trial_data['perceived_rotation'] = response
+    trial_duration = trial_end_time - trial_start_time
+    movement_duration = trial_end_time - movement_start_time if movement_start_time else 0
     
-    results.append(trial_data)
+    log_writer.writerow((
+        trial_start_time,
+        trial_num,
+        int(is_error_trial),
+        rotation_angle if is_error_trial else 0,
+        rotation_onset_time if rotation_active else None,
+        trial_duration,
+        movement_duration,
+        float(trajectory[0, 1]) if n_samples else cursor_pos[0],
+        float(trajectory[0, 2]) if n_samples else cursor_pos[1],
+        target_pos[0],
+        target_pos[1],
+        boundary_x,
+        perceived_rotation
+    ))
+    log_fp.flush()
+    n_completed += 1
     
     # ------------------------
     # ITI
     # ------------------------
-    clock = core.Clock()
-    while clock.getTime() < ITI_DURATION:
-        fixation.draw()
-        win.flip()
+    fixation.draw()
+    win.flip()
+    core.wait(ITI_DURATION)
 
 # ------------------------
 # End screen
@@ -632,16 +672,12 @@ core.wait(3.0)
 
 
 # ------------------------
-# Save data
+# Close data file
 # ------------------------
-with open(log_file, "w", newline="") as f:
-    if results:
-        writer = csv.DictWriter(f, fieldnames=results[0].keys())
-        writer.writeheader()
-        writer.writerows(results)
+log_fp.close()
 
 print(f"Data saved to: {log_file}")
-print(f"Total trials completed: {len(results)}")
+print(f"Total trials completed: {n_completed}")
 
 # Cleanup
 win.close()
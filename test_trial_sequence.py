@@ -0,0 +1,126 @@
+"""
+Checks for the v2 trial sequence generator.
+
+The constructive generator should give the same distribution of sequences as
+the original approach (reshuffle until the consecutive-trial limits are met),
+not just sequences that meet the limits.
+
+USAGE:
+    python -m unittest test_trial_sequence
+"""
+
+import itertools
+import random
+import unittest
+from collections import Counter
+
+try:
+    from task1_observation_errp_v2 import CORRECT, ERROR, generate_trial_sequence
+except ImportError:  # PsychoPy / numpy not installed
+    generate_trial_sequence = None
+
+# Error rate and run limits shared by the presets
+ERROR_RATE = 0.25
+MAX_CONSEC_ERRORS = 3
+MAX_CONSEC_CORRECT = 5
+
+
+def is_valid(sequence, max_consec_errors, max_consec_correct):
+    """Check a sequence against the consecutive-trial limits."""
+    for trial_type, run in itertools.groupby(sequence):
+        limit = max_consec_errors if trial_type == ERROR else max_consec_correct
+        if len(list(run)) > limit:
+            return False
+    return True
+
+
+def count_error_runs(sequence):
+    """Count the runs of error trials in a sequence."""
+    return sum(1 for trial_type, _ in itertools.groupby(sequence) if trial_type == ERROR)
+
+
+def baseline_sequence(n_trials, error_rate, max_consec_errors, max_consec_correct, rng):
+    """Reshuffle until the limits are met (the original generator)."""
+    n_errors = int(n_trials * error_rate)
+    sequence = [CORRECT] * (n_trials - n_errors) + [ERROR] * n_errors
+    while True:
+        rng.shuffle(sequence)
+        if is_valid(sequence, max_consec_errors, max_consec_correct):
+            return list(sequence)
+
+
+def run_count_frequencies(sequences):
+    """Relative frequency of each error-run count."""
+    counts = Counter(count_error_runs(sequence) for sequence in sequences)
+    total = sum(counts.values())
+    return {n_runs: count / total for n_runs, count in counts.items()}
+
+
+def total_variation(p, q):
+    """Total variation distance between two frequency dicts."""
+    return sum(abs(p.get(k, 0) - q.get(k, 0)) for k in set(p) | set(q)) / 2
+
+
+@unittest.skipIf(generate_trial_sequence is None, "PsychoPy and numpy are required")
+class TestGenerateTrialSequence(unittest.TestCase):
+
+    def test_sequences_meet_limits(self):
+        rng = random.Random(0)
+        for n_trials in (40, 60, 80):
+            for _ in range(200):
+                sequence = generate_trial_sequence(
+                    n_trials, ERROR_RATE, MAX_CONSEC_ERRORS, MAX_CONSEC_CORRECT, rng)
+                self.assertEqual(len(sequence), n_trials)
+                self.assertEqual(sequence.count(ERROR), int(n_trials * ERROR_RATE))
+                self.assertTrue(is_valid(sequence, MAX_CONSEC_ERRORS, MAX_CONSEC_CORRECT))
+
+    def test_long_block(self):
+        # Run counts here are too large for recursion or float weights
+        n_trials = 3000
+        sequence = generate_trial_sequence(
+            n_trials, ERROR_RATE, MAX_CONSEC_ERRORS, MAX_CONSEC_CORRECT, random.Random(3))
+        self.assertEqual(len(sequence), n_trials)
+        self.assertTrue(is_valid(sequence, MAX_CONSEC_ERRORS, MAX_CONSEC_CORRECT))
+
+    def test_small_block_is_uniform_over_valid_sequences(self):
+        # Few enough trials to list every valid sequence
+        n_trials, error_rate, max_errors, max_correct = 10, 0.3, 2, 3
+        n_errors = int(n_trials * error_rate)
+        valid = set()
+        for error_idx in itertools.combinations(range(n_trials), n_errors):
+            sequence = [CORRECT] * n_trials
+            for i in error_idx:
+                sequence[i] = ERROR
+            if is_valid(sequence, max_errors, max_correct):
+                valid.add(tuple(sequence))
+
+        rng = random.Random(1)
+        n_draws = 200 * len(valid)
+        counts = Counter(
+            tuple(generate_trial_sequence(n_trials, error_rate, max_errors, max_correct, rng))
+            for _ in range(n_draws)
+        )
+        self.assertEqual(set(counts), valid)
+        for count in counts.values():
+            self.assertAlmostEqual(count / n_draws, 1 / len(valid), delta=0.4 / len(valid))
+
+    def test_run_counts_match_baseline(self):
+        # Quick preset block size; larger blocks make the baseline slow
+        n_trials, n_draws = 40, 3000
+        rng = random.Random(2)
+        new = run_count_frequencies(
+            generate_trial_sequence(n_trials, ERROR_RATE, MAX_CONSEC_ERRORS,
+                                    MAX_CONSEC_CORRECT, rng)
+            for _ in range(n_draws)
+        )
+        baseline = run_count_frequencies(
+            baseline_sequence(n_trials, ERROR_RATE, MAX_CONSEC_ERRORS,
+                              MAX_CONSEC_CORRECT, rng)
+            for _ in range(n_draws)
+        )
+        self.assertGreater(len(new), 1)
+        self.assertLess(total_variation(new, baseline), 0.05)
+
+
+if __name__ == '__main__':
+    unittest.main()